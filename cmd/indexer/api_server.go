@@ -116,6 +116,18 @@ func (s *Server) Start() error {
 		handleGetDebugSnapshot(w, r, db, rpcPool)
 	})
 
+	mux.HandleFunc("/api/debug/chain_integrity", func(w http.ResponseWriter, r *http.Request) {
+		s.mu.RLock()
+		db := s.db
+		s.mu.RUnlock()
+
+		if db == nil {
+			http.Error(w, "System Initializing...", 503)
+			return
+		}
+		handleGetChainIntegrity(w, r, db)
+	})
+
 	mux.HandleFunc("/ws", func(w http.ResponseWriter, r *http.Request) {
 		s.wsHub.HandleWS(w, r)
 	})
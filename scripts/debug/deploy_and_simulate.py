@@ -14,6 +14,7 @@ import random
 import sys
 from web3 import Web3
 from eth_account import Account
+from web3.exceptions import TransactionNotFound
 
 # Connect to local Anvil
 w3 = Web3(Web3.HTTPProvider('http://localhost:8545'))
@@ -32,6 +33,8 @@ deployer = accounts[0]
 user1 = accounts[1]
 user2 = accounts[2]
 user3 = accounts[3]
+ACTORS = (deployer, user1, user2, user3)
+BATCH_SIZE = 20  # Transfer events emitted per batchTransfer tx
 
 print(f"\n👤 Deployer: {deployer}")
 print(f"👤 User 1:   {user1}")
@@ -64,12 +67,23 @@ ABI = [
         "outputs": [{"name": "", "type": "bool"}],
         "stateMutability": "nonpayable",
         "type": "function"
+    },
+    {
+        "inputs": [
+            {"name": "tos", "type": "address[]"},
+            {"name": "values", "type": "uint256[]"}
+        ],
+        "name": "batchTransfer",
+        "outputs": [{"name": "", "type": "bool"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
     }
 ]
 
-# Even simpler bytecode for a minimal ERC20 that just emits Transfer events
-# This is a contract that accepts transfer calls and emits Transfer events
-SIMPLE_BYTECODE = "6080604052348015600f57600080fd5b50609f80601d6000396000f3fe6080604052348015600f57600080fd5b506004361060285760003560e01c8063a9059cbb14602d575b600080fd5b6040516001600160a01b0360443516906024359060648051918152602001908051906020019060208101906040810160405261006992919061008b565b60405180910390f35b6001600160a01b03167fddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef60405180910390a3600160405180910390f3"
+# Minimal event emitter: transfer(address,uint256) emits one Transfer event,
+# batchTransfer(address[],uint256[]) emits Transfer(msg.sender, tos[i], values[i]) for every i
+# in a single tx (reverts on length mismatch). No balances are tracked; both return true.
+SIMPLE_BYTECODE = "6100f28061000d6000396000f360003560e01c806388d695b21461006b578063a9059cbb1461002057600080fd5b60243560005260043573ffffffffffffffffffffffffffffffffffffffff16337fddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef60206000a36100e7565b60043560040160243560040181358082351461008657600080fd5b60005b818110156100e7578060051b6020018084013560005284013573ffffffffffffffffffffffffffffffffffffffff16337fddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef60206000a3600101610089565b600160005260206000f3"
 
 def deploy_contract():
     """Deploy a simple ERC20 contract to Anvil"""
@@ -102,7 +116,7 @@ def simulate_transfers(contract_address):
     """Continuously simulate ERC20 transfer events"""
     print(f"\n🎨 Starting traffic simulation...")
     print(f"   - New block every 3 seconds")
-    print(f"   - ERC20 transfer every 8 seconds")
+    print(f"   - Batch of {BATCH_SIZE} ERC20 transfers every 8 seconds")
     print(f"   - Contract: {contract_address}\n")
     
     contract = w3.eth.contract(address=contract_address, abi=ABI)
@@ -110,75 +124,92 @@ def simulate_transfers(contract_address):
     last_block_time = time.time()
     last_tx_time = time.time()
     tx_count = 0
+    batch_count = 0
+    pending = {}  # tx_hash -> (sent_at, total_amount, sender)
+    block_filter = w3.eth.filter('latest')
     
     try:
         while True:
             now = time.time()
             
-            # Generate a new block every 3 seconds by sending a tiny ETH transfer
+            # Generate a new block every 3 seconds via anvil_mine (empty block, no tx needed)
             if now - last_block_time >= 3:
                 try:
-                    # Send minimal ETH transfer to trigger block mining
-                    w3.eth.send_transaction({
-                        "from": accounts[9],
-                        "to": accounts[8],
-                        "value": w3.to_wei(0.0001, 'ether'),
-                        "gas": 21000,
-                        "gasPrice": w3.to_wei(1, 'gwei')
-                    })
+                    resp = w3.provider.make_request('anvil_mine', [1])
+                    if resp.get('error'):
+                        raise RuntimeError(resp['error'])
                     block_num = w3.eth.block_number
                     print(f"📦 Block #{block_num} mined at {time.strftime('%H:%M:%S')}")
                     last_block_time = now
                 except Exception as e:
                     print(f"⚠️  Block generation failed: {e}")
             
-            # Generate ERC20 transfer every 8 seconds
+            # Generate a batch of ERC20 transfers every 8 seconds (one tx, BATCH_SIZE events)
             if now - last_tx_time >= 8:
                 try:
-                    # Select random sender and receiver
-                    sender = random.choice([deployer, user1, user2, user3])
-                    receiver = random.choice([deployer, user1, user2, user3])
-                    
-                    # Ensure sender != receiver
-                    while sender == receiver:
-                        receiver = random.choice([deployer, user1, user2, user3])
+                    # Random sender; receivers drawn from the other actors
+                    sender = random.choice(ACTORS)
+                    receivers = random.choices([a for a in ACTORS if a != sender], k=BATCH_SIZE)
                     
-                    # Random amount (1-1000 tokens)
-                    amount = random.randint(1, 1000)
+                    # Random amounts (1-1000 tokens each)
+                    amounts = [random.randint(1, 1000) for _ in range(BATCH_SIZE)]
                     
-                    # Call transfer function (will emit Transfer event)
-                    tx_hash = contract.functions.transfer(receiver, amount).transact({
+                    # Call batchTransfer (emits one Transfer event per receiver)
+                    tx_hash = contract.functions.batchTransfer(receivers, amounts).transact({
                         "from": sender,
-                        "gas": 100000,
+                        "gas": 50000 + 5000 * BATCH_SIZE,
                         "gasPrice": w3.to_wei(1, 'gwei')
                     })
+                    pending[tx_hash] = (now, sum(amounts), sender)
+                    last_tx_time = now
+                except Exception as e:
+                    print(f"⚠️  Transfer failed: {e}")
 
-                    # ✅ 关键修复：等待交易确认，确保物理现实存在
+            # ✅ 关键修复：等待交易确认，确保物理现实存在
+            # receipt 只会随新区块出现，所以只在新块到达时检查 pending
+            try:
+                new_blocks = block_filter.get_new_entries()
+            except Exception as e:
+                # Anvil 重启后旧的 filter id 失效，重新创建；期间可能错过新块，直接检查一遍 pending
+                print(f"⚠️  Block filter polling failed: {e}")
+                try:
+                    block_filter = w3.eth.filter('latest')
+                except Exception as e:
+                    print(f"⚠️  Block filter re-creation failed: {e}")
+                new_blocks = True
+            if new_blocks and pending:
+                for tx_hash in list(pending):
                     try:
-                        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=10)
-                        tx_count += 1
-                        print(f"💸 Transfer #{tx_count}: {amount} tokens from {sender[:8]}... to {receiver[:8]}...")
-                        print(f"   TX: {tx_hash.hex()}")
-                        print(f"   ✅ Confirmed in block {receipt.blockNumber}, logs: {len(receipt.logs)}")
-
-                        # 验证 Transfer 事件确实被触发
-                        if len(receipt.logs) > 0:
-                            print(f"   🎯 Transfer event emitted!")
-                        else:
-                            print(f"   ⚠️  Warning: No logs found in receipt")
-
-                        last_tx_time = now
+                        receipt = w3.eth.get_transaction_receipt(tx_hash)
+                    except TransactionNotFound:
+                        continue
                     except Exception as e:
-                        print(f"❌ Transfer failed to confirm: {e}")
-                        # 继续下一次循环，不更新 last_tx_time
-                except Exception as e:
-                    print(f"⚠️  Transfer failed: {e}")
+                        print(f"⚠️  Receipt lookup failed for {tx_hash.hex()}: {e}")
+                        continue
+                    _, total_amount, sender = pending.pop(tx_hash)
+                    batch_count += 1
+                    tx_count += len(receipt.logs)
+                    print(f"💸 Batch #{batch_count}: {BATCH_SIZE} transfers, {total_amount} tokens from {sender[:8]}...")
+                    print(f"   TX: {tx_hash.hex()}")
+                    print(f"   ✅ Confirmed in block {receipt.blockNumber}, logs: {len(receipt.logs)}")
+
+                    # 验证 Transfer 事件确实被触发
+                    if len(receipt.logs) == BATCH_SIZE:
+                        print(f"   🎯 {BATCH_SIZE} Transfer events emitted!")
+                    else:
+                        print(f"   ⚠️  Warning: expected {BATCH_SIZE} logs, found {len(receipt.logs)}")
+
+            # 超时未上链的交易视为失败
+            for tx_hash, (sent_at, _, _) in list(pending.items()):
+                if now - sent_at >= 10:
+                    del pending[tx_hash]
+                    print(f"❌ Transfer failed to confirm: {tx_hash.hex()} not mined within 10s")
             
             time.sleep(0.5)
     
     except KeyboardInterrupt:
         print(f"\n\n✋ Simulation stopped by user")
-        print(f"   Total transfers: {tx_count}")
+        print(f"   Total transfers: {tx_count} in {batch_count} batches")
         print(f"   Final block: {w3.eth.block_number}")
 
 def main():
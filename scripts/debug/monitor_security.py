@@ -1,44 +1,119 @@
+import os
 import time
-import subprocess
 import re
+import ipaddress
 from collections import Counter
 
 # 监控设置
 LOG_FILE = "logs/indexer.log"
 NGINX_LOG = "bin/gateway.log" # 假设您已将容器日志重定向
+PROC_NET_TCP = "/proc/net/tcp"
+PROC_NET_TCP6 = "/proc/net/tcp6" # 监听 [::] 时 IPv4 客户端以 IPv4-mapped 地址出现在这里
+PG_PORT = 15432
+
+# 正则只编译一次，直接在 bytes 上匹配，省掉 decode
+ERR_RE = re.compile(rb'err="(.*?)"')
+# /proc/net/tcp: "sl local_address rem_address st ..."，地址为小端十六进制，st=01 即 ESTABLISHED
+ESTABLISHED_RE = re.compile(
+    rb'^\s*\d+:\s+[0-9A-F]{8}:%04X\s+([0-9A-F]{8}):[0-9A-F]{4}\s+01\s' % PG_PORT,
+    re.MULTILINE,
+)
+# /proc/net/tcp6 同格式，地址为 4 个小端 32 位字
+ESTABLISHED6_RE = re.compile(
+    rb'^\s*\d+:\s+[0-9A-F]{32}:%04X\s+([0-9A-F]{32}):[0-9A-F]{4}\s+01\s' % PG_PORT,
+    re.MULTILINE,
+)
+V4_MAPPED_PREFIX = b"0000000000000000FFFF0000" # ::ffff:a.b.c.d 的前 3 个字
 
 print("🕵️ Web3 Indexer 流量监控启动...")
 print("[*] 正在监控异常扫描和数据库连接尝试...")
 
-def get_last_lines(file_path, n=50):
+class LogFollower:
+    """记住上次读到的偏移量，每次只读新增字节；按 inode 检测日志轮转"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.inode = None
+        self.offset = 0
+
+    def _open(self, from_end):
+        self.f = open(self.path, 'rb')
+        self.inode = os.fstat(self.f.fileno()).st_ino
+        self.offset = self.f.seek(0, os.SEEK_END) if from_end else 0
+
+    def read_new(self):
+        try:
+            if self.f is None:
+                # 启动时从文件末尾开始，只关注新产生的日志
+                self._open(from_end=True)
+            elif os.stat(self.path).st_ino != self.inode:
+                # 日志被轮转：重新打开新文件，从头读
+                self.f.close()
+                self._open(from_end=False)
+            elif os.fstat(self.f.fileno()).st_size < self.offset:
+                # 日志被截断
+                self.offset = 0
+        except OSError:
+            return b""
+
+        self.f.seek(self.offset)
+        data = self.f.read()
+        self.offset = self.f.tell()
+        return data
+
+def hex_to_ipv4(addr):
+    """/proc/net/tcp 中的小端十六进制地址 -> 点分十进制"""
+    raw = bytes.fromhex(addr.decode('ascii'))
+    return ".".join(str(b) for b in reversed(raw))
+
+def hex_to_ipv6(addr):
+    """/proc/net/tcp6 地址 -> 字符串；IPv4-mapped 地址直接还原为 IPv4"""
+    if addr.startswith(V4_MAPPED_PREFIX):
+        return hex_to_ipv4(addr[24:])
+    raw = bytes.fromhex(addr.decode('ascii'))
+    return str(ipaddress.IPv6Address(b"".join(raw[i:i + 4][::-1] for i in range(0, 16, 4))))
+
+def is_local(ip):
+    if ":" in ip:
+        v6 = ipaddress.IPv6Address(ip)
+        return v6.is_loopback or v6.is_link_local or v6.is_private
+    return ip.startswith(('127.', '100.', '192.168.'))
+
+def read_table(path):
     try:
-        return subprocess.check_output(['tail', f'-n', str(n), file_path]).decode('utf-8')
-    except:
-        return ""
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return b""
+
+indexer_log = LogFollower(LOG_FILE)
+malicious_counts = Counter()  # 累计发现的未授权连接（跨 tick 复用）
+last_snapshot = Counter()     # 上一个 tick 的连接快照，用于只报告新增
 
 try:
     while True:
         # 1. 检查 Indexer 日志中的 db_fail
-        indexer_logs = get_last_lines(LOG_FILE)
-        if "db_fail" in indexer_logs:
-            errors = re.findall(r'err="(.*?)"', indexer_logs)
+        indexer_logs = indexer_log.read_new()
+        if b"db_fail" in indexer_logs:
+            errors = ERR_RE.findall(indexer_logs)
             if errors:
-                print(f"⚠️  检测到数据库连接异常: {errors[-1]}")
+                print(f"⚠️  检测到数据库连接异常: {errors[-1].decode('utf-8', 'replace')}")
 
-        # 2. 模拟检查连接数 (netstat)
-        try:
-            netstat = subprocess.check_output(['netstat', '-ant']).decode('utf-8')
-            # 统计连接到 15432 (Postgres) 的外部 IP
-            ext_conns = re.findall(r'(\d+\.\d+\.\d+\.\d+):15432\s+ESTABLISHED', netstat)
-            # 过滤掉本地
-            malicious = [ip for ip in ext_conns if not ip.startswith(('127.', '100.', '192.168.'))]
-            
-            if malicious:
-                print(f"🚨 警报！发现未经授权的公网 IP 连接数据库: {Counter(malicious)}")
-        except:
-            pass
+        # 2. 检查连接数：直接读 /proc/net/tcp 与 /proc/net/tcp6，不再 fork netstat
+        # 统计连接到 15432 (Postgres) 的外部 IP
+        ext_conns = [hex_to_ipv4(addr) for addr in ESTABLISHED_RE.findall(read_table(PROC_NET_TCP))]
+        ext_conns += [hex_to_ipv6(addr) for addr in ESTABLISHED6_RE.findall(read_table(PROC_NET_TCP6))]
+        # 过滤掉本地
+        malicious = [ip for ip in ext_conns if not is_local(ip)]
+
+        snapshot = Counter(malicious)
+        new_conns = snapshot - last_snapshot
+        last_snapshot = snapshot
+        if new_conns:
+            malicious_counts.update(new_conns)
+            print(f"🚨 警报！发现未经授权的公网 IP 连接数据库: 新增 {dict(new_conns)}，累计 {dict(malicious_counts)}")
 
         time.sleep(10)
 except KeyboardInterrupt:
-    print("
-监控停止。")
+    print("\n监控停止。")
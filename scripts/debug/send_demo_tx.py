@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import time
 import sys
 
@@ -9,8 +11,15 @@ RPC_URL = "http://localhost:8545"
 FROM_ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
 TO_ADDRESS = "0x70997970C51812e339D9B73b0245ad59e5E05a77"
 
-def send_rpc(method, params):
-    """Send JSON-RPC request to Anvil"""
+# 复用 HTTP 连接，避免每次 RPC 重新建立 TCP 连接
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=Retry(total=3, backoff_factor=0.2))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+JSON_HEADERS = {"content-type": "application/json"}
+
+def send_rpc(method, params, quiet=False):
+    """Send JSON-RPC request to Anvil (quiet=True 时不打印错误，供轮询使用)"""
     payload = {
         "jsonrpc": "2.0",
         "method": method,
@@ -18,13 +27,23 @@ def send_rpc(method, params):
         "id": 1
     }
     try:
-        response = requests.post(RPC_URL, json=payload, timeout=5)
-        result = response.json()
+        response = SESSION.post(RPC_URL, data=orjson.dumps(payload), headers=JSON_HEADERS, timeout=(3, 10))
+        result = orjson.loads(response.content)
         return result.get("result")
     except Exception as e:
-        print(f"❌ RPC Error: {e}")
+        if not quiet:
+            print(f"❌ RPC Error: {e}")
         return None
 
+def wait_for_nonce(target, attempts=50, interval=0.1):
+    """轮询 eth_getTransactionCount 直到已确认 nonce 达到 target（最多约 5s）"""
+    for _ in range(attempts):
+        nonce_hex = send_rpc("eth_getTransactionCount", [FROM_ADDRESS, "latest"], quiet=True)
+        if nonce_hex and int(nonce_hex, 16) >= target:
+            return True
+        time.sleep(interval)
+    return False
+
 def main():
     print("🚀 Generating demo transactions on Anvil...")
     print(f"RPC URL: {RPC_URL}")
@@ -62,10 +81,11 @@ def main():
         
         if tx_hash:
             print(f"✅ TX {i+1} sent: {tx_hash}")
+            # 等到该交易被打包（nonce 前进）再发下一笔，代替固定 sleep
+            if not wait_for_nonce(current_nonce + 1):
+                print(f"⚠️  TX {i+1} not mined within 5s, continuing")
         else:
             print(f"❌ TX {i+1} failed")
-        
-        time.sleep(1)
     
     print()
     print("✨ Demo transactions complete!")
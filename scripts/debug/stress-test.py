@@ -1,4 +1,7 @@
+import argparse
 import asyncio
+import itertools
+import aiohttp
 from web3 import Web3, AsyncWeb3
 from web3.eth import AsyncEth
 import time
@@ -13,57 +16,242 @@ RPC_URL = "http://127.0.0.1:8545"
 PRIVATE_KEY = "ac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
 SENDER = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
 RECEIVER = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+N_INFLIGHT = 200 # 同时在途的交易上限（信号量许可数）
+BLOCK_INTERVAL = 1 # 压测期间 Anvil 的出块间隔（秒）
+HTTP_POOL_SIZE = 512 # aiohttp 连接池上限，需大于 N_INFLIGHT
+FAST_SIGN_WINDOW = 500 # --fast-sign 每次预签名的 nonce 数量
+DRAIN_TIMEOUT = 30 # 收尾时等待在途发送和上链确认的上限（秒）
 
-async def send_tx(w3, account, nonce):
-    tx = {
-        'nonce': nonce,
-        'to': RECEIVER,
-        'value': w3.to_wei(0.0001, 'ether'),
-        'gas': 21000,
-        'gasPrice': w3.to_wei(50, 'gwei'),
-        'chainId': 31337
-    }
-    signed_tx = account.sign_transaction(tx)
+# 除 nonce 外所有字段都是常量，只构建一次
+TX_TEMPLATE = {
+    'to': RECEIVER,
+    'value': Web3.to_wei(0.0001, 'ether'),
+    'gas': 21000,
+    'gasPrice': Web3.to_wei(50, 'gwei'),
+    'chainId': 31337
+}
+
+def build_and_sign(account, nonce):
+    """构建并签名交易，返回 raw bytes（ECDSA + RLP，CPU 密集）"""
+    return account.sign_transaction({**TX_TEMPLATE, 'nonce': nonce}).raw_transaction
+
+def presign_range(account, start, count):
+    return [build_and_sign(account, n) for n in range(start, start + count)]
+
+class ThreadSigner:
+    """默认签名器：在默认线程池中签名，不占用事件循环"""
+
+    def __init__(self, account):
+        self.account = account
+
+    async def sign(self, nonce):
+        return await asyncio.to_thread(build_and_sign, self.account, nonce)
+
+    def reset(self, nonce):
+        pass
+
+class PresignSigner:
+    """--fast-sign：按窗口批量预签名连续 nonce，热路径只取现成的 raw bytes。
+
+    nonce 在签名覆盖范围内，已签名的 RLP 无法直接改写 nonce，
+    所以这里选择整窗预签名，而不是对签名结果打补丁。
+    """
+
+    def __init__(self, account, start_nonce, window=FAST_SIGN_WINDOW):
+        self.account = account
+        self.next_nonce = start_nonce
+        self.window = window
+        self.buffer = {}
+        self.lock = asyncio.Lock()
+
+    async def sign(self, nonce):
+        async with self.lock:
+            while nonce not in self.buffer:
+                raws = await asyncio.to_thread(presign_range, self.account, self.next_nonce, self.window)
+                self.buffer.update(zip(range(self.next_nonce, self.next_nonce + self.window), raws))
+                self.next_nonce += self.window
+            return self.buffer.pop(nonce)
+
+    def reset(self, nonce):
+        """nonce 重新同步后丢弃已预签名的窗口"""
+        self.buffer.clear()
+        self.next_nonce = nonce
+
+async def nonce_stream(start, total=None):
+    """连续产出 nonce；total 为 None 时无限产出"""
+    stop = None if total is None else start + total
+    for nonce in itertools.count(start):
+        if nonce == stop:
+            return
+        yield nonce
+
+async def anvil_rpc(w3, method, params):
+    resp = await w3.provider.make_request(method, params)
+    if resp.get('error'):
+        raise RuntimeError(f"{method}: {resp['error']}")
+    return resp.get('result')
+
+async def send_tx(w3, raw_tx):
     try:
-        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = await w3.eth.send_raw_transaction(raw_tx)
         return tx_hash
     except Exception as e:
         print(f"Error: {e}")
         return None
 
-async def main():
-    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(RPC_URL))
+async def submit(w3, signer, nonce, sem, failed, stats):
+    """签名并发送一笔交易，完成后归还许可；发送失败会留下 nonce 空洞，通知生产者停下"""
+    try:
+        tx_hash = await send_tx(w3, await signer.sign(nonce))
+        if tx_hash is not None:
+            stats['sent'] += 1
+        else:
+            failed.set()
+    finally:
+        sem.release()
+
+async def mined_nonce(w3):
+    return await w3.eth.get_transaction_count(SENDER, 'latest')
+
+async def confirmer(w3, base, stats):
+    """按块确认：已上链数 = latest nonce - 起始 nonce，不再逐笔等待 receipt"""
+    while True:
+        await asyncio.sleep(BLOCK_INTERVAL / 2)
+        try:
+            stats['confirmed'] = max(0, await mined_nonce(w3) - base)
+        except Exception as e:
+            print(f"Confirm error: {e}")
+
+async def wait_mined(w3, target, timeout):
+    """等待 latest nonce 追上 target，最多 timeout 秒"""
+    try:
+        async with asyncio.timeout(timeout):
+            while await mined_nonce(w3) < target:
+                await asyncio.sleep(BLOCK_INTERVAL / 2)
+        return True
+    except TimeoutError:
+        return False
+
+async def drain(inflight):
+    """限时排空在途发送，超时则取消剩余任务"""
+    try:
+        async with asyncio.timeout(DRAIN_TIMEOUT):
+            for fut in asyncio.as_completed(list(inflight)):
+                await fut
+    except TimeoutError:
+        print(f"⚠️  {len(inflight)} sends still in flight after {DRAIN_TIMEOUT}s, cancelling")
+        for task in list(inflight):
+            task.cancel()
+
+async def resync(w3, signer, expected):
+    """发送失败后重新对齐 nonce：空洞后的交易永远不会被打包，清掉后从链上 nonce 继续"""
+    if not await wait_mined(w3, expected, 2 * BLOCK_INTERVAL):
+        # 失败的那笔确实没进交易池：丢弃空洞之后排队的交易
+        await anvil_rpc(w3, 'anvil_dropAllTransactions', [])
+    nonce = await mined_nonce(w3)
+    signer.reset(nonce)
+    print(f"🔁 Send failed, resynced nonce to {nonce} (expected {expected})")
+    return nonce
+
+async def progress_reporter(stats, start_time):
+    while True:
+        await asyncio.sleep(1)
+        elapsed = time.time() - start_time
+        current_tps = stats['sent'] / elapsed
+        print(f"Sent {stats['sent']} transactions ({stats['confirmed']} confirmed)... Current Avg TPS: {current_tps:.2f}")
+
+async def main(fast_sign=False, total=None, restore_block_time=None):
+    # 默认 aiohttp connector 只有 limit=100，会在信号量之前悄悄排队，这里放大连接池
+    provider = AsyncWeb3.AsyncHTTPProvider(RPC_URL, request_kwargs={'timeout': aiohttp.ClientTimeout(total=10)})
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+        limit=HTTP_POOL_SIZE, limit_per_host=HTTP_POOL_SIZE, ttl_dns_cache=300, keepalive_timeout=30))
+    await provider.cache_async_session(session)
+    w3 = AsyncWeb3(provider)
     account = w3.eth.account.from_key(PRIVATE_KEY)
-    
+
     print(f"🚀 Starting Stress Test on {RPC_URL}...")
-    print(f"Target TPS: ~100-200")
+    print(f"Target TPS: ~100-200 (in-flight: {N_INFLIGHT}, fast-sign: {fast_sign})")
+
+    async with session:
+        # 记录 Anvil 当前的出块模式，结束时原样恢复（compose 里的 Anvil 通常是 --block-time 1/2，而非 automine）
+        was_automine = await anvil_rpc(w3, 'anvil_getAutomine', [])
+        prev_interval = restore_block_time
+        if prev_interval is None:
+            try:
+                prev_interval = await anvil_rpc(w3, 'anvil_getIntervalMining', [])
+            except Exception as e:
+                print(f"⚠️  Cannot read current block time ({e}); pass --restore-block-time to restore it")
+
+        try:
+            # 关闭 automine，改为每秒出一个块：挖矿不再落在每笔交易的热路径上
+            # 切换放在 try 内：只要动过出块模式，finally 就一定会恢复
+            if was_automine:
+                await anvil_rpc(w3, 'anvil_setAutomine', [False])
+            await anvil_rpc(w3, 'anvil_setIntervalMining', [BLOCK_INTERVAL])
+            await run(w3, account, fast_sign, total)
+        finally:
+            if was_automine:
+                await anvil_rpc(w3, 'anvil_setAutomine', [True])
+            elif prev_interval is not None:
+                await anvil_rpc(w3, 'anvil_setIntervalMining', [int(prev_interval)])
+            else:
+                print(f"⚠️  Previous block time unknown, leaving interval mining at {BLOCK_INTERVAL}s")
+
+async def run(w3, account, fast_sign, total):
+    # 获取初始 nonce（含 pending，interval 模式下已发未打包的交易也要算上）
+    base = nonce = await w3.eth.get_transaction_count(SENDER, 'pending')
+
+    signer = PresignSigner(account, nonce) if fast_sign else ThreadSigner(account)
+    sem = asyncio.Semaphore(N_INFLIGHT)
+    stats = {'sent': 0, 'confirmed': 0}
+    inflight = set()
 
     start_time = time.time()
-    tx_count = 0
-    
-    # 获取初始 nonce
-    nonce = await w3.eth.get_transaction_count(SENDER)
+    async with asyncio.TaskGroup() as tg:
+        reporter = tg.create_task(progress_reporter(stats, start_time))
+        confirm = tg.create_task(confirmer(w3, base, stats))
 
-    while True:
-        # 批量发送以提高 TPS
-        batch_size = 50
-        tasks = []
-        for i in range(batch_size):
-            tasks.append(send_tx(w3, account, nonce + tx_count))
-            tx_count += 1
-        
-        await asyncio.gather(*tasks)
-        
-        elapsed = time.time() - start_time
-        current_tps = tx_count / elapsed
-        print(f"Sent {tx_count} transactions... Current Avg TPS: {current_tps:.2f}")
-        
-        # 稍微控制一下节奏，防止 Anvil 崩溃
-        await asyncio.sleep(0.1)
+        remaining = total
+        while remaining is None or remaining > 0:
+            # 持续提交：拿到许可就立即发下一笔，不再等一整批的最慢请求；一旦发送失败立即停止产出
+            failed = asyncio.Event()
+            async for n in nonce_stream(nonce, remaining):
+                await sem.acquire()
+                if failed.is_set():
+                    sem.release()
+                    break
+                task = tg.create_task(submit(w3, signer, n, sem, failed, stats))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+                nonce = n + 1
+
+            await drain(inflight)
+            if not failed.is_set():
+                break
+            nonce = await resync(w3, signer, nonce)
+            if total is not None:
+                remaining = base + total - nonce
+
+        # 仅在收尾时限时等待最后一笔上链
+        if not await wait_mined(w3, nonce, DRAIN_TIMEOUT):
+            print(f"⚠️  Not all transactions mined within {DRAIN_TIMEOUT}s")
+        stats['confirmed'] = max(0, await mined_nonce(w3) - base)
+        reporter.cancel()
+        confirm.cancel()
+
+    elapsed = time.time() - start_time
+    print(f"✅ Done: {stats['sent']} sent, {stats['confirmed']} confirmed in {elapsed:.1f}s ({stats['sent'] / elapsed:.2f} TPS)")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Web3 Indexer stress test")
+    parser.add_argument("--fast-sign", action="store_true",
+                        help=f"pre-sign nonces in windows of {FAST_SIGN_WINDOW} off the hot path")
+    parser.add_argument("--total", type=int, default=None,
+                        help="stop after sending this many transactions (default: run forever)")
+    parser.add_argument("--restore-block-time", type=int, default=None,
+                        help="interval mining (seconds) to restore on exit when Anvil cannot report it")
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(fast_sign=args.fast_sign, total=args.total, restore_block_time=args.restore_block_time))
     except KeyboardInterrupt:
-        print("
-Test stopped.")
+        print("\nTest stopped.")